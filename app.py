@@ -1,41 +1,100 @@
 import streamlit as st
 import supabase
 from supabase import create_client, Client
-from transformers import pipeline
+import os
+import shutil
+import numpy as np
+import orjson
 import requests
-import json
-from datetime import datetime
-import plotly.graph_objects as go
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Secrets (Streamlit Pro dashboard)
 SUPABASE_URL = st.secrets["SUPABASE_URL"]
 SUPABASE_ANON_KEY = st.secrets["SUPABASE_ANON_KEY"]
 GUMROAD_ACCESS_TOKEN = st.secrets["GUMROAD_ACCESS_TOKEN"]
 GUMROAD_PRODUCT_ID = st.secrets["GUMROAD_PRODUCT_ID"]  # e.g., "abc123def"
+SENTIMENT_PRECISION = st.secrets.get("SENTIMENT_PRECISION", "fp32")  # "fp32" or "int8" (opt-in)
 
 # Init Supabase (non-Streamlit)
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+# Shared HTTP session (keep-alive pooling for Reddit + Gumroad), kept across reruns
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=Retry(total=2, backoff_factor=0.2)))
+    return session
+
 # UI Config FIRST
 st.set_page_config(page_title="Product Review AI", layout="wide")
 
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+ONNX_MODEL_DIR = "./distilbert-onnx"
+INT8_MODEL_REPO = "optimum/distilbert-base-uncased-finetuned-sst-2-english"
+INT8_MODEL_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Heavy ML imports are deferred to first use to keep cold-start paint fast
+def export_onnx_model() -> str:
+    # One-time ONNX export; reused across reruns and restarts
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from transformers import AutoTokenizer
+    if not os.path.isfile(os.path.join(ONNX_MODEL_DIR, "model.onnx")):
+        # Export to a scratch dir and swap it in, so an interrupted export is never reused
+        tmp_dir = ONNX_MODEL_DIR + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        model = ORTModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL, export=True, provider="CPUExecutionProvider")
+        model.save_pretrained(tmp_dir)
+        AutoTokenizer.from_pretrained(SENTIMENT_MODEL).save_pretrained(tmp_dir)
+        shutil.rmtree(ONNX_MODEL_DIR, ignore_errors=True)
+        os.replace(tmp_dir, ONNX_MODEL_DIR)
+    return ONNX_MODEL_DIR
+
+def ort_session_options():
+    import onnxruntime as ort
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # CPUs this process may run on (affinity-aware), not the host's core count
+    so.intra_op_num_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 0
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    # Don't spin idle threads between requests on shared hosts
+    so.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return so
+
 # Load model (cached, after config)
 @st.cache_resource
 def load_sentiment_model():
-    return pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english")
-
-sentiment_pipeline = load_sentiment_model()
-
-def scrape_reddit_reviews(product: str) -> list[str]:
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from transformers import AutoTokenizer, pipeline
+    # FP32 by default; dynamic INT8 is opt-in until its labels are checked against FP32
+    if SENTIMENT_PRECISION == "int8":
+        # Pre-quantized hub checkpoint: no export/quantize pass on cold start
+        model_dir, file_name = INT8_MODEL_REPO, INT8_MODEL_FILE
+    else:
+        model_dir, file_name = export_onnx_model(), "model.onnx"
+    model = ORTModelForSequenceClassification.from_pretrained(model_dir, file_name=file_name, provider="CPUExecutionProvider", session_options=ort_session_options())
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    sentiment_pipe = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+    # Warm-up: pay first-run ORT/page-in cost during load, not on first query
+    # (batch parity is checked pre-deploy by scripts/check_batch_parity.py)
+    sentiment_pipe(["warmup"] * 2, batch_size=2, truncation=True, max_length=16)
+    return sentiment_pipe
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_reddit_reviews(product: str) -> list[str]:
+    # Cached per product; failures raise so they are never cached
     query = product.replace(" ", "+") + "+review"
     url = f"https://www.reddit.com/search.json?q={query}&sort=new&limit=10"
+    resp = orjson.loads(get_http_session().get(url, timeout=10).content)
+    return [
+        post["data"]["title"] + " " + (post["data"]["selftext"] or "")
+        for post in resp["data"]["children"]
+        if len(post["data"]["selftext"] or "") > 20
+    ]
+
+def scrape_reddit_reviews(product: str) -> list[str]:
     try:
-        resp = requests.get(url, timeout=10).json()
-        return [
-            post["data"]["title"] + " " + (post["data"]["selftext"] or "")
-            for post in resp["data"]["children"]
-            if len(post["data"]["selftext"] or "") > 20
-        ]
+        return fetch_reddit_reviews(product)
     except Exception as e:
         st.error(f"Fetch failed: {e}")
         return []
@@ -44,21 +103,25 @@ def scrape_google_reviews(product: str) -> list[str]:
     # Premium: Real integration later; mock for now
     return [f"Deep insight: {product} excels in usability (4.8/5 from Google).", f"Trend: Recent updates boost {product} quality."]
 
+@st.cache_data(ttl=3600, show_spinner=False)
 def get_sentiment_summary(reviews: list[str]):
+    # Drop short/duplicate texts and clip long ones before tokenizing
+    reviews = list(dict.fromkeys(r[:512] for r in reviews if len(r) > 20))
     if not reviews:
-        return {"overall": "NO_DATA", "avg_score": 0, "details": []}
-    sentiments = sentiment_pipeline(reviews)
-    scores = [1 if s["label"] == "POSITIVE" else 0 for s in sentiments]
-    avg_score = sum(scores) / len(scores)
+        return {"overall": "NO_DATA", "avg_score": 0, "details": [], "n": 0}
+    sentiment_pipeline = load_sentiment_model()
+    sentiments = sentiment_pipeline(reviews, batch_size=16, truncation=True, max_length=128)
+    positives = np.fromiter((s["label"] == "POSITIVE" for s in sentiments), dtype=np.uint8, count=len(sentiments))
+    avg_score = float(positives.mean())
     overall = "POSITIVE" if avg_score > 0.6 else "NEGATIVE" if avg_score < 0.4 else "NEUTRAL"
-    return {"overall": overall, "avg_score": avg_score, "details": sentiments[:5]}
+    return {"overall": overall, "avg_score": avg_score, "details": sentiments[:5], "n": len(reviews)}
 
 def verify_gumroad_sub(email: str, code: str) -> bool:
     # Poll API + code match
     url = "https://api.gumroad.com/v2/sales"
     params = {"access_token": GUMROAD_ACCESS_TOKEN, "product_id": GUMROAD_PRODUCT_ID, "email": email, "status": "alive"}
     try:
-        resp = requests.get(url, params=params).json()
+        resp = get_http_session().get(url, params=params, timeout=10).json()
         sales = resp.get("sales", [])
         if sales and any(sale.get("custom_fields", {}).get("code", "") == code for sale in sales):
             return True
@@ -66,6 +129,7 @@ def verify_gumroad_sub(email: str, code: str) -> bool:
         pass
     return False
 
+@st.cache_data(ttl=300, show_spinner=False)
 def get_user_stats(email: str):
     # Fetch or create user
     res = supabase.table("users").select("searches_used, is_premium").eq("email", email).execute()
@@ -76,15 +140,22 @@ def get_user_stats(email: str):
         supabase.table("users").insert({"email": email, "searches_used": 0, "is_premium": False}).execute()
         return {"searches_used": 0, "is_premium": False}
 
-def increment_search(email: str):
-    supabase.table("users").update({"searches_used": supabase.sql("searches_used + 1")}).eq("email", email).execute()
-
 def set_premium(email: str):
     supabase.table("users").update({"is_premium": True}).eq("email", email).execute()
+    get_user_stats.clear()
 
-def save_review(user_id: str, product: str, summary: dict, searches_used: int):
-    data = {"user_id": user_id, "product_name": product, "sentiment_score": summary["avg_score"], "review_summary": json.dumps(summary["details"]), "searches_used": searches_used, "created_at": datetime.now().isoformat()}
-    supabase.table("saved_reviews").insert(data).execute()
+def record_search(user_id: str, product: str, summary: dict) -> int | None:
+    # Increment + save in one RPC (see supabase/migrations); returns new searches_used
+    params = {"p_email": user_id, "p_product": product, "p_score": summary["avg_score"], "p_summary": summary["details"]}
+    try:
+        searches_used = supabase.rpc("record_search", params).execute().data
+        if searches_used is None:
+            raise ValueError("no search count returned")
+    except Exception as e:
+        st.error(f"Save failed: {e}")
+        return None
+    get_user_stats.clear()
+    return searches_used
 
 # Sidebar: Quick Auth (Always Visible)
 with st.sidebar:
@@ -129,22 +200,25 @@ if st.button("Get Deep Review", type="primary") and product and st.session_state
             with col1:
                 st.metric("Overall Score", f"{summary['avg_score']:.1%}", delta="🟢 Positive vibes")
             with col2:
-                labels = [s["label"] for s in summary["details"]]
-                scores = [s["score"] for s in summary["details"]]
-                fig = go.Figure([go.Bar(x=labels, y=scores, marker_color=['green' if l == 'POSITIVE' else 'red' for l in labels])])
+                import plotly.graph_objects as go
+                details = summary["details"]
+                labels = np.array([d["label"] for d in details])
+                scores = np.array([d["score"] for d in details], dtype=np.float32)
+                colors = np.where(labels == "POSITIVE", "green", "red")
+                fig = go.Figure([go.Bar(x=labels, y=scores, marker_color=colors)])
                 fig.update_layout(title="Sentiment Breakdown")
                 st.plotly_chart(fig, use_container_width=True)
 
             rec = "🟢 Buy Now – Top Pick!" if summary["overall"] == "POSITIVE" else "🔴 Avoid – Red Flags" if summary["overall"] == "NEGATIVE" else "🟡 Consider – Mixed Bag"
             st.markdown(f"**Verdict**: {rec}")
-            st.write(f"Powered by {len(reviews)} sources (Reddit + Google).")
+            st.write(f"Powered by {summary['n']} sources (Reddit + Google).")
 
             # Increment & Save
-            increment_search(st.session_state.email)
-            st.session_state.stats["searches_used"] += 1  # Local update
-            save_review(st.session_state.email, product, summary, st.session_state.stats["searches_used"])
-            st.balloons()
-            st.success(f"Search {st.session_state.stats['searches_used']}/2 complete!" if st.session_state.stats["searches_used"] < 2 else "Unlimited access active!")
+            searches_used = record_search(st.session_state.email, product, summary)
+            if searches_used is not None:
+                st.session_state.stats["searches_used"] = searches_used
+                st.balloons()
+                st.success(f"Search {st.session_state.stats['searches_used']}/2 complete!" if st.session_state.stats["searches_used"] < 2 else "Unlimited access active!")
     else:
         st.error("Trial exhausted! Upgrade via sidebar for unlimited.")
         # Gumroad Widget Fallback
@@ -0,0 +1,43 @@
+"""One-off pre-deploy check: batched ONNX sentiment outputs match single-sample outputs.
+
+Run after the app has exported the model once, e.g.
+    python scripts/check_batch_parity.py
+    python scripts/check_batch_parity.py --model optimum/distilbert-base-uncased-finetuned-sst-2-english --file-name onnx/model_qint8_avx512_vnni.onnx --atol 0.05
+"""
+import argparse
+import sys
+
+from optimum.onnxruntime import ORTModelForSequenceClassification
+from transformers import AutoTokenizer, pipeline
+
+FIXTURE = [
+    "Great product, works perfectly.",
+    "Terrible.",
+    "It broke after two days and support never replied to any of my emails.",
+    "Decent value for the price, though the battery could be better.",
+]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="./distilbert-onnx")
+    parser.add_argument("--file-name", default="model.onnx")
+    # Dynamic INT8 scales activations per batch, so allow a looser tolerance there
+    parser.add_argument("--atol", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    model = ORTModelForSequenceClassification.from_pretrained(args.model, file_name=args.file_name, provider="CPUExecutionProvider")
+    pipe = pipeline("sentiment-analysis", model=model, tokenizer=AutoTokenizer.from_pretrained(args.model))
+
+    batched = pipe(FIXTURE, batch_size=len(FIXTURE), truncation=True, max_length=128)
+    single = [pipe(text, truncation=True, max_length=128)[0] for text in FIXTURE]
+
+    ok = True
+    for text, b, s in zip(FIXTURE, batched, single):
+        if b["label"] != s["label"] or abs(b["score"] - s["score"]) > args.atol:
+            ok = False
+            print(f"MISMATCH {text!r}: batched={b} single={s}")
+    print("OK: batched outputs match single-sample outputs" if ok else "FAILED: check ONNX dynamic axes / quantization")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
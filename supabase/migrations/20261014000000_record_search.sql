@@ -0,0 +1,18 @@
+-- Bump the user's search count and save the review in one round-trip.
+-- Returns the new searches_used value.
+create or replace function record_search(p_email text, p_product text, p_score float, p_summary jsonb)
+returns int
+language plpgsql
+as $$
+declare
+  n int;
+begin
+  update users set searches_used = searches_used + 1 where email = p_email returning searches_used into n;
+  if n is null then
+    raise exception 'record_search: no users row updated for %', p_email;
+  end if;
+  insert into saved_reviews (user_id, product_name, sentiment_score, review_summary, searches_used, created_at)
+  values (p_email, p_product, p_score, p_summary, n, now());
+  return n;
+end
+$$;
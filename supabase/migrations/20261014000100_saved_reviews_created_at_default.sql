@@ -0,0 +1,20 @@
+-- Server-authoritative timestamps for saved reviews.
+alter table saved_reviews alter column created_at type timestamptz using created_at::timestamptz;
+alter table saved_reviews alter column created_at set default now();
+
+create or replace function record_search(p_email text, p_product text, p_score float, p_summary jsonb)
+returns int
+language plpgsql
+as $$
+declare
+  n int;
+begin
+  update users set searches_used = searches_used + 1 where email = p_email returning searches_used into n;
+  if n is null then
+    raise exception 'record_search: no users row updated for %', p_email;
+  end if;
+  insert into saved_reviews (user_id, product_name, sentiment_score, review_summary, searches_used)
+  values (p_email, p_product, p_score, p_summary, n);
+  return n;
+end
+$$;